@@ -0,0 +1,10 @@
+-- Computed column for airea_knowledge: the first 1500 characters of content.
+-- PostgREST exposes functions that take the table row as selectable fields, so
+-- chat search can request `snippet:content_snippet` instead of full `content`.
+CREATE OR REPLACE FUNCTION public.content_snippet(airea_knowledge)
+RETURNS text
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT left($1.content, 1500)
+$$;
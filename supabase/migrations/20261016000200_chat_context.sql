@@ -0,0 +1,28 @@
+-- Chat context in one round trip: the most recent turns for a session plus,
+-- when the caller's cached value has expired, the airea_knowledge count.
+-- p_with_count lets the API skip the count(*) while its cache is fresh.
+CREATE OR REPLACE FUNCTION public.chat_context(
+    p_session text,
+    p_limit int DEFAULT 5,
+    p_with_count boolean DEFAULT true
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'recent', COALESCE((
+            SELECT jsonb_agg(row_to_json(c))
+            FROM (
+                SELECT user_message, airea_response, created_at
+                FROM airea_conversations
+                WHERE session_id = p_session
+                ORDER BY created_at DESC
+                LIMIT p_limit
+            ) c
+        ), '[]'::jsonb),
+        'doc_count', CASE WHEN p_with_count
+                          THEN (SELECT count(*) FROM airea_knowledge)
+                     END
+    )
+$$;
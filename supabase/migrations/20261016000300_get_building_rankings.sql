@@ -0,0 +1,34 @@
+-- Building rankings in one round trip: the top highrise (and optionally
+-- midrise) rows by score_v3, with score_v2 stripped server-side.
+CREATE OR REPLACE FUNCTION public.get_building_rankings(
+    p_top_n int DEFAULT 10,
+    p_include_midrise boolean DEFAULT false,
+    p_building_name text DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'highrise', COALESCE((
+            SELECT jsonb_agg(to_jsonb(r) - 'score_v2' ORDER BY r.score_v3 DESC)
+            FROM (
+                SELECT *
+                FROM building_rankings
+                WHERE p_building_name IS NULL OR "Tower Name" = p_building_name
+                ORDER BY score_v3 DESC
+                LIMIT p_top_n
+            ) r
+        ), '[]'::jsonb),
+        'midrise', CASE WHEN p_include_midrise THEN COALESCE((
+            SELECT jsonb_agg(to_jsonb(m) - 'score_v2' ORDER BY m.score_v3 DESC)
+            FROM (
+                SELECT *
+                FROM midrise_rankings
+                WHERE p_building_name IS NULL OR "Tower Name" = p_building_name
+                ORDER BY score_v3 DESC
+                LIMIT p_top_n
+            ) m
+        ), '[]'::jsonb) END
+    )
+$$;
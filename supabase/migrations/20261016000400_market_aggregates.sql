@@ -0,0 +1,164 @@
+-- Server-side aggregates for the market report, market stats and building
+-- stats tools, so the API receives a handful of numbers instead of every
+-- matching lvhr_master row.
+
+-- Parse MLS money/area text the way the API does client-side: '$' and ','
+-- are stripped; '0', blanks and unparseable values are ignored (NULL).
+CREATE OR REPLACE FUNCTION public.lvhr_to_numeric(value text)
+RETURNS numeric
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN v <> '0' AND v ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$' THEN v::numeric
+    END
+    FROM (SELECT replace(replace(value, '$', ''), ',', '') AS v) s
+$$;
+
+CREATE OR REPLACE FUNCTION public.lvhr_to_int(value text)
+RETURNS int
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE WHEN value ~ '^\s*[-+]?\d+\s*$' THEN value::int END
+$$;
+
+-- Sold-sales metrics for two periods (NULL bounds mean unbounded).
+CREATE OR REPLACE FUNCTION public.market_report_agg(
+    p_tower text DEFAULT NULL,
+    p_start date DEFAULT NULL,
+    p_end date DEFAULT NULL,
+    p_compare_start date DEFAULT NULL,
+    p_compare_end date DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH sales AS (
+        SELECT actual_close_date_parsed AS closed,
+               lvhr_to_numeric("Close Price"::text) AS price,
+               lvhr_to_numeric("LP/SqFt"::text) AS ppsf
+        FROM lvhr_master
+        WHERE "Stat" IN ('S', 'H')
+          AND (p_tower IS NULL OR "Tower Name" = p_tower)
+    )
+    SELECT jsonb_build_object(
+        'current', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'total_volume', COALESCE(sum(price), 0)
+            )
+            FROM sales
+            WHERE (p_start IS NULL OR closed >= p_start)
+              AND (p_end IS NULL OR closed <= p_end)
+        ),
+        'comparison', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'total_volume', COALESCE(sum(price), 0)
+            )
+            FROM sales
+            WHERE (p_compare_start IS NULL OR closed >= p_compare_start)
+              AND (p_compare_end IS NULL OR closed <= p_compare_end)
+        )
+    )
+$$;
+
+-- Active and all-time sold metrics across every building.
+CREATE OR REPLACE FUNCTION public.market_stats_agg(p_active_status text[])
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH active AS (
+        SELECT lvhr_to_numeric("List Price"::text) AS price,
+               lvhr_to_numeric("LP/SqFt"::text) AS ppsf,
+               CASE WHEN "DOM"::text <> '0' THEN lvhr_to_int("DOM"::text) END AS dom
+        FROM lvhr_master
+        WHERE "Stat" = ANY (p_active_status)
+    ), sold AS (
+        SELECT lvhr_to_numeric("Close Price"::text) AS price,
+               lvhr_to_numeric("SP/SqFt"::text) AS ppsf
+        FROM lvhr_master
+        WHERE "Stat" IN ('S', 'H')
+    )
+    SELECT jsonb_build_object(
+        'active', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'avg_dom', COALESCE(avg(dom), 0),
+                'total_volume', COALESCE(sum(price), 0)
+            )
+            FROM active
+        ),
+        'sold', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'total_volume', COALESCE(sum(price), 0)
+            )
+            FROM sold
+        )
+    )
+$$;
+
+-- Ranking row plus active and sold metrics for one building.
+CREATE OR REPLACE FUNCTION public.building_stats_agg(p_tower text, p_active_status text[])
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH active AS (
+        SELECT "Beds Total"::text AS beds,
+               lvhr_to_numeric("List Price"::text) AS price,
+               lvhr_to_numeric("LP/SqFt"::text) AS ppsf,
+               lvhr_to_int("DOM"::text) AS dom
+        FROM lvhr_master
+        WHERE "Tower Name" = p_tower
+          AND "Stat" = ANY (p_active_status)
+    ), sold AS (
+        SELECT lvhr_to_numeric("Close Price"::text) AS price,
+               lvhr_to_numeric("SP/SqFt"::text) AS ppsf
+        FROM lvhr_master
+        WHERE "Tower Name" = p_tower
+          AND "Stat" IN ('S', 'H')
+    )
+    SELECT jsonb_build_object(
+        'ranking', COALESCE((
+            SELECT to_jsonb(r)
+            FROM building_rankings r
+            WHERE r."Tower Name" = p_tower
+            LIMIT 1
+        ), '{}'::jsonb),
+        'active', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'avg_dom', COALESCE(avg(dom), 0),
+                'by_bedroom', COALESCE((
+                    SELECT jsonb_object_agg(COALESCE(beds, 'None'), n)
+                    FROM (SELECT beds, count(*) AS n FROM active GROUP BY beds) b
+                ), '{}'::jsonb)
+            )
+            FROM active
+        ),
+        'sold', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'avg_price', COALESCE(avg(price), 0),
+                'avg_ppsf', COALESCE(avg(ppsf), 0),
+                'total_volume', COALESCE(sum(price), 0)
+            )
+            FROM sold
+        )
+    )
+$$;
@@ -0,0 +1,28 @@
+-- Hot leads in one round trip: hot_list is semi-joined to lvhr_master in
+-- Postgres instead of shipping every ML# back and forth as an IN() list.
+CREATE INDEX IF NOT EXISTS hot_list_mls_idx ON hot_list ("ML#");
+
+CREATE OR REPLACE FUNCTION public.get_hot_leads(
+    p_building text DEFAULT NULL,
+    p_limit int DEFAULT 20
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'hot_list_rows', (SELECT count(*) FROM hot_list),
+        'hot_list_total', (SELECT count(NULLIF("ML#"::text, '')) FROM hot_list),
+        'leads', COALESCE((
+            SELECT jsonb_agg(to_jsonb(l))
+            FROM (
+                SELECT m."ML#", m."Address", m."Tower Name", m."List Price", m."LP/SqFt",
+                       m."Beds Total", m."Baths Total", m."Approx Liv Area", m."DOM", m."Stat"
+                FROM lvhr_master m
+                WHERE m."ML#" IN (SELECT h."ML#" FROM hot_list h)
+                  AND (p_building IS NULL OR m."Tower Name" = p_building)
+                LIMIT p_limit
+            ) l
+        ), '[]'::jsonb)
+    )
+$$;
@@ -0,0 +1,18 @@
+-- Composite indexes led by the most selective filter the listing tools send
+-- (one building out of a few dozen), then status, then the range/sort column.
+
+-- query_active_listings, generate_cma, building stats: tower + status + price
+CREATE INDEX IF NOT EXISTS lvhr_tower_stat_price_idx
+    ON lvhr_master ("Tower Name", "Stat", "List Price");
+
+-- query_sales_history, market report: tower + status, newest closings first
+CREATE INDEX IF NOT EXISTS lvhr_tower_stat_close_idx
+    ON lvhr_master ("Tower Name", "Stat", actual_close_date_parsed DESC);
+
+-- Market-wide sales history (no building filter)
+CREATE INDEX IF NOT EXISTS lvhr_stat_close_idx
+    ON lvhr_master ("Stat", actual_close_date_parsed DESC);
+
+-- query_stale_listings: tower + recency
+CREATE INDEX IF NOT EXISTS stale_listings_tower_marked_idx
+    ON stale_listings_prospecting ("Tower Name", date_marked_stale DESC);
@@ -0,0 +1,20 @@
+-- Numeric shadows of the MLS money/area text columns. Range filters on the
+-- text columns compared strings ('$950,000' > '1000000'), and every reader
+-- had to strip '$' and ',' itself. lvhr_to_numeric() is the same IMMUTABLE
+-- parser the aggregate RPCs use, so unparseable values become NULL instead
+-- of failing the write.
+ALTER TABLE lvhr_master
+    ADD COLUMN IF NOT EXISTS list_price_num numeric
+        GENERATED ALWAYS AS (lvhr_to_numeric("List Price"::text)) STORED,
+    ADD COLUMN IF NOT EXISTS close_price_num numeric
+        GENERATED ALWAYS AS (lvhr_to_numeric("Close Price"::text)) STORED,
+    ADD COLUMN IF NOT EXISTS lp_sqft_num numeric
+        GENERATED ALWAYS AS (lvhr_to_numeric("LP/SqFt"::text)) STORED,
+    ADD COLUMN IF NOT EXISTS sp_sqft_num numeric
+        GENERATED ALWAYS AS (lvhr_to_numeric("SP/SqFt"::text)) STORED;
+
+-- query_active_listings price ranges, optionally within one building
+CREATE INDEX IF NOT EXISTS lvhr_list_price_num_idx
+    ON lvhr_master (list_price_num);
+CREATE INDEX IF NOT EXISTS lvhr_tower_stat_list_price_num_idx
+    ON lvhr_master ("Tower Name", "Stat", list_price_num);
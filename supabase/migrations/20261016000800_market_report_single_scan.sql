@@ -0,0 +1,59 @@
+-- market_report_agg in a single scan: both periods are aggregated with
+-- FILTER clauses over one pass of the sold rows (instead of two subqueries
+-- over the CTE), reading the numeric shadow columns directly.
+CREATE OR REPLACE FUNCTION public.market_report_agg(
+    p_tower text DEFAULT NULL,
+    p_start date DEFAULT NULL,
+    p_end date DEFAULT NULL,
+    p_compare_start date DEFAULT NULL,
+    p_compare_end date DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH periods AS (
+        SELECT close_price_num AS price,
+               lp_sqft_num AS ppsf,
+               (p_start IS NULL OR actual_close_date_parsed >= p_start)
+                   AND (p_end IS NULL OR actual_close_date_parsed <= p_end) AS in_current,
+               (p_compare_start IS NULL OR actual_close_date_parsed >= p_compare_start)
+                   AND (p_compare_end IS NULL OR actual_close_date_parsed <= p_compare_end) AS in_comparison
+        FROM lvhr_master
+        WHERE "Stat" IN ('S', 'H')
+          AND (p_tower IS NULL OR "Tower Name" = p_tower)
+          AND (
+              p_start IS NULL OR p_compare_start IS NULL
+              OR actual_close_date_parsed >= LEAST(p_start, p_compare_start)
+          )
+          AND (
+              p_end IS NULL OR p_compare_end IS NULL
+              OR actual_close_date_parsed <= GREATEST(p_end, p_compare_end)
+          )
+    ), totals AS (
+        SELECT count(*) FILTER (WHERE in_current) AS cur_count,
+               avg(price) FILTER (WHERE in_current) AS cur_price,
+               avg(ppsf) FILTER (WHERE in_current) AS cur_ppsf,
+               sum(price) FILTER (WHERE in_current) AS cur_volume,
+               count(*) FILTER (WHERE in_comparison) AS cmp_count,
+               avg(price) FILTER (WHERE in_comparison) AS cmp_price,
+               avg(ppsf) FILTER (WHERE in_comparison) AS cmp_ppsf,
+               sum(price) FILTER (WHERE in_comparison) AS cmp_volume
+        FROM periods
+    )
+    SELECT jsonb_build_object(
+        'current', jsonb_build_object(
+            'count', cur_count,
+            'avg_price', COALESCE(cur_price, 0),
+            'avg_ppsf', COALESCE(cur_ppsf, 0),
+            'total_volume', COALESCE(cur_volume, 0)
+        ),
+        'comparison', jsonb_build_object(
+            'count', cmp_count,
+            'avg_price', COALESCE(cmp_price, 0),
+            'avg_ppsf', COALESCE(cmp_ppsf, 0),
+            'total_volume', COALESCE(cmp_volume, 0)
+        )
+    )
+    FROM totals
+$$;
@@ -0,0 +1,15 @@
+-- Status-filtered views over lvhr_master so the listing tools stop sending
+-- the same Stat IN (...) predicate on every request. The code lists must
+-- match ACTIVE_STATUS_CODES and the sold codes in airea_api_server_v2.py.
+CREATE OR REPLACE VIEW public.v_active_listings
+WITH (security_invoker = true) AS
+    SELECT *
+    FROM lvhr_master
+    WHERE "Stat" IN ('A-ER', 'A-EA', 'CSL');
+
+-- S = Sold (first 365 days), H = Historical (day 366+)
+CREATE OR REPLACE VIEW public.v_sold_listings
+WITH (security_invoker = true) AS
+    SELECT *
+    FROM lvhr_master
+    WHERE "Stat" IN ('S', 'H');
@@ -0,0 +1,60 @@
+-- Price and PPSF ranges for generate_cma, computed in Postgres so the API
+-- only fetches the handful of sample rows it shows. Sold stats cover the
+-- p_sales_limit most recent closings, matching the API's sales sample.
+CREATE OR REPLACE FUNCTION public.cma_stats(
+    p_tower text,
+    p_beds text DEFAULT NULL,
+    p_sales_limit int DEFAULT 500
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH active AS (
+        SELECT list_price_num AS price, lp_sqft_num AS ppsf
+        FROM v_active_listings
+        WHERE "Tower Name" = p_tower
+          AND (p_beds IS NULL OR "Beds Total"::text = p_beds)
+    ), sold AS (
+        SELECT close_price_num AS price, sp_sqft_num AS ppsf
+        FROM v_sold_listings
+        WHERE "Tower Name" = p_tower
+          AND (p_beds IS NULL OR "Beds Total"::text = p_beds)
+        ORDER BY actual_close_date_parsed DESC
+        LIMIT p_sales_limit
+    )
+    SELECT jsonb_build_object(
+        'active', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'price_range', jsonb_build_object(
+                    'low', COALESCE(min(price), 0),
+                    'high', COALESCE(max(price), 0),
+                    'avg', COALESCE(avg(price), 0)
+                ),
+                'ppsf_range', jsonb_build_object(
+                    'low', COALESCE(min(ppsf), 0),
+                    'high', COALESCE(max(ppsf), 0),
+                    'avg', COALESCE(avg(ppsf), 0)
+                )
+            )
+            FROM active
+        ),
+        'sold', (
+            SELECT jsonb_build_object(
+                'count', count(*),
+                'price_range', jsonb_build_object(
+                    'low', COALESCE(min(price), 0),
+                    'high', COALESCE(max(price), 0),
+                    'avg', COALESCE(avg(price), 0)
+                ),
+                'ppsf_range', jsonb_build_object(
+                    'low', COALESCE(min(ppsf), 0),
+                    'high', COALESCE(max(ppsf), 0),
+                    'avg', COALESCE(avg(ppsf), 0)
+                )
+            )
+            FROM sold
+        )
+    )
+$$;
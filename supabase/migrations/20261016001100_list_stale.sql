@@ -0,0 +1,26 @@
+-- Stale (expired/withdrawn) listings marked within the last p_months calendar
+-- months, newest first. The cutoff is computed in Postgres with interval
+-- math instead of the API's old 30-days-per-month approximation.
+CREATE INDEX IF NOT EXISTS stale_listings_marked_idx
+    ON stale_listings_prospecting (date_marked_stale DESC);
+
+CREATE OR REPLACE FUNCTION public.list_stale(
+    p_tower text DEFAULT NULL,
+    p_months int DEFAULT 12,
+    p_limit int DEFAULT 20
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE(jsonb_agg(to_jsonb(s)), '[]'::jsonb)
+    FROM (
+        SELECT "ML#", "Tower Name", "Unit Number", "Address", "List Price",
+               "List Date", "DOM", "List Agent Full Name", date_marked_stale, previous_status
+        FROM stale_listings_prospecting
+        WHERE (p_tower IS NULL OR "Tower Name" = p_tower)
+          AND date_marked_stale::date >= (current_date - make_interval(months => p_months))::date
+        ORDER BY date_marked_stale DESC
+        LIMIT p_limit
+    ) s
+$$;
@@ -0,0 +1,7 @@
+-- Most-recent-sales lookups (generate_cma, cma_stats) filter one building's
+-- S/H rows and take the newest N. A partial index in that exact order lets
+-- Postgres read the first N entries instead of sorting the building's
+-- whole sales history.
+CREATE INDEX IF NOT EXISTS lvhr_sold_tower_close_idx
+    ON lvhr_master ("Tower Name", actual_close_date_parsed DESC)
+    WHERE "Stat" IN ('S', 'H');
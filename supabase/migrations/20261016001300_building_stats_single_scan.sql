@@ -0,0 +1,61 @@
+-- building_stats_agg in a single pass over the building's rows: active and
+-- sold metrics are FILTER aggregates over one scan (instead of separate
+-- active and sold scans), reading the numeric shadow columns.
+CREATE OR REPLACE FUNCTION public.building_stats_agg(p_tower text, p_active_status text[])
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH listings AS MATERIALIZED (
+        SELECT "Stat" = ANY (p_active_status) AS is_active,
+               "Beds Total"::text AS beds,
+               list_price_num,
+               lp_sqft_num,
+               lvhr_to_int("DOM"::text) AS dom,
+               close_price_num,
+               sp_sqft_num
+        FROM lvhr_master
+        WHERE "Tower Name" = p_tower
+          AND ("Stat" = ANY (p_active_status) OR "Stat" IN ('S', 'H'))
+    ), totals AS (
+        SELECT count(*) FILTER (WHERE is_active) AS active_count,
+               avg(list_price_num) FILTER (WHERE is_active) AS active_price,
+               avg(lp_sqft_num) FILTER (WHERE is_active) AS active_ppsf,
+               avg(dom) FILTER (WHERE is_active) AS active_dom,
+               count(*) FILTER (WHERE NOT is_active) AS sold_count,
+               avg(close_price_num) FILTER (WHERE NOT is_active) AS sold_price,
+               avg(sp_sqft_num) FILTER (WHERE NOT is_active) AS sold_ppsf,
+               sum(close_price_num) FILTER (WHERE NOT is_active) AS sold_volume
+        FROM listings
+    )
+    SELECT jsonb_build_object(
+        'ranking', COALESCE((
+            SELECT to_jsonb(r)
+            FROM building_rankings r
+            WHERE r."Tower Name" = p_tower
+            LIMIT 1
+        ), '{}'::jsonb),
+        'active', jsonb_build_object(
+            'count', active_count,
+            'avg_price', COALESCE(active_price, 0),
+            'avg_ppsf', COALESCE(active_ppsf, 0),
+            'avg_dom', COALESCE(active_dom, 0),
+            'by_bedroom', COALESCE((
+                SELECT jsonb_object_agg(COALESCE(beds, 'None'), n)
+                FROM (
+                    SELECT beds, count(*) AS n
+                    FROM listings
+                    WHERE is_active
+                    GROUP BY beds
+                ) b
+            ), '{}'::jsonb)
+        ),
+        'sold', jsonb_build_object(
+            'count', sold_count,
+            'avg_price', COALESCE(sold_price, 0),
+            'avg_ppsf', COALESCE(sold_ppsf, 0),
+            'total_volume', COALESCE(sold_volume, 0)
+        )
+    )
+    FROM totals
+$$;
@@ -0,0 +1,11 @@
+-- Per-status task counts for the get_team_tasks summary, so the API reads a
+-- handful of rows instead of every task's status.
+CREATE OR REPLACE FUNCTION public.team_task_status_counts()
+RETURNS TABLE(status text, n bigint)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT status, count(*)
+    FROM team_tasks
+    GROUP BY status
+$$;
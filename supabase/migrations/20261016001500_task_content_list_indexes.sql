@@ -0,0 +1,14 @@
+-- Newest-first listing indexes for get_team_tasks and get_content_history.
+-- The status-leading indexes serve the filtered board/draft-queue views; the
+-- created_at ones serve the unfiltered lists.
+CREATE INDEX IF NOT EXISTS team_tasks_status_created_idx
+    ON team_tasks (status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS team_tasks_created_idx
+    ON team_tasks (created_at DESC);
+
+CREATE INDEX IF NOT EXISTS content_history_status_created_idx
+    ON content_history (status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS content_history_created_idx
+    ON content_history (created_at DESC);
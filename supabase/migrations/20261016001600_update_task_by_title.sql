@@ -0,0 +1,24 @@
+-- Find-and-update for update_task_status when only part of a title is known:
+-- one statement locates the newest task whose title contains p_title and
+-- returns it updated. NULL p_status / p_priority leave that column unchanged.
+CREATE OR REPLACE FUNCTION public.update_task_by_title(
+    p_title text,
+    p_status text DEFAULT NULL,
+    p_priority text DEFAULT NULL
+)
+RETURNS SETOF team_tasks
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE team_tasks t
+    SET status = COALESCE(p_status, t.status),
+        priority = COALESCE(p_priority, t.priority)
+    WHERE t.id = (
+        SELECT id
+        FROM team_tasks
+        WHERE title ILIKE '%' || p_title || '%'
+        ORDER BY created_at DESC
+        LIMIT 1
+    )
+    RETURNING t.*
+$$;
@@ -0,0 +1,6 @@
+-- create_team_task resolves assignees with full_name ILIKE '%name%'; a
+-- trigram index serves that substring match without scanning user_profiles.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS user_profiles_full_name_trgm_idx
+    ON user_profiles USING gin (full_name gin_trgm_ops);
@@ -0,0 +1,16 @@
+-- search_knowledge_base runs one ILIKE '%term%' query per column and merges
+-- the results; trigram indexes let each of those use an index instead of
+-- scanning airea_knowledge. created_at orders every search newest-first.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS airea_knowledge_content_trgm_idx
+    ON airea_knowledge USING gin (content gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS airea_knowledge_title_trgm_idx
+    ON airea_knowledge USING gin ((metadata->>'title') gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS airea_knowledge_source_trgm_idx
+    ON airea_knowledge USING gin (source gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS airea_knowledge_created_idx
+    ON airea_knowledge (created_at DESC);
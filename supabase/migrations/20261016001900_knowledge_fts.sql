@@ -0,0 +1,11 @@
+-- Full-text search for search_knowledge_base: a stored tsvector over content
+-- and title with a GIN index, queried with PostgREST's fts operator. Content
+-- is capped before indexing because a tsvector is limited to 1MB.
+ALTER TABLE airea_knowledge
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('english', left(coalesce(content, ''), 200000) || ' ' || coalesce(metadata->>'title', ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS airea_knowledge_content_tsv_idx
+    ON airea_knowledge USING gin (content_tsv);